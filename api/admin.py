@@ -1,11 +1,78 @@
-from django.contrib import admin
-from .models import Category, Transaction, Budget
+from django.contrib import admin, messages
+from django.contrib.admin.actions import delete_selected
+from django.contrib.admin.options import IS_POPUP_VAR
+from django.contrib.admin.templatetags.admin_urls import add_preserved_filters
+from django.contrib.auth.admin import UserAdmin
+from django.contrib.auth.models import User
+from django.http import HttpResponseRedirect
+from django.urls import reverse
+from .models import Category, Transaction, Budget, Job
+from .deletion import schedule_category_deletion, schedule_user_deletion
+
+
+class ScheduledDeletionMixin:
+    """Admin deletes hand off to the background deletion pipeline instead of cascading inline"""
+    schedule_deletion = None
+    actions = ['delete_selected']  # Replaces the site-wide action of the same name
+    
+    def get_deleted_objects(self, objs, request):
+        # Skip the cascade collector, which would load every dependent row just to list it
+        return [str(obj) for obj in objs], {}, set(), []
+    
+    def log_deletion(self, request, obj, object_repr):
+        # The row still exists until the job runs, so record the request as a change
+        return self.log_change(request, obj, 'Deletion scheduled.')
+    
+    def delete_model(self, request, obj):
+        self.schedule_deletion(obj, request.user)
+    
+    def delete_queryset(self, request, queryset):
+        for obj in queryset:
+            self.delete_model(request, obj)
+    
+    def response_delete(self, request, obj_display, obj_id):
+        if IS_POPUP_VAR in request.POST:
+            return super().response_delete(request, obj_display, obj_id)
+        
+        self.message_user(request, f"Deletion of {obj_display} has been scheduled.", messages.SUCCESS)
+        opts = self.opts
+        if self.has_change_permission(request, None):
+            post_url = reverse(f'admin:{opts.app_label}_{opts.model_name}_changelist', current_app=self.admin_site.name)
+            post_url = add_preserved_filters(
+                {'preserved_filters': self.get_preserved_filters(request), 'opts': opts}, post_url
+            )
+        else:
+            post_url = reverse('admin:index', current_app=self.admin_site.name)
+        return HttpResponseRedirect(post_url)
+    
+    @admin.action(permissions=['delete'], description=delete_selected.short_description)
+    def delete_selected(self, request, queryset):
+        # Reuse the stock confirmation page, but report the confirmed deletion as scheduled
+        if not request.POST.get('post'):
+            return delete_selected(self, request, queryset)
+        
+        objs = list(queryset)
+        for obj in objs:
+            self.log_deletion(request, obj, str(obj))
+        self.delete_queryset(request, queryset)
+        self.message_user(
+            request, f"Deletion of {len(objs)} {self.opts.verbose_name_plural} has been scheduled.", messages.SUCCESS
+        )
+
+
+admin.site.unregister(User)
+
+
+@admin.register(User)
+class BackgroundDeleteUserAdmin(ScheduledDeletionMixin, UserAdmin):
+    schedule_deletion = staticmethod(schedule_user_deletion)
 
 
 @admin.register(Category)
-class CategoryAdmin(admin.ModelAdmin):
-    list_display = ['name', 'type', 'user', 'created_at']
-    list_filter = ['type', 'created_at']
+class CategoryAdmin(ScheduledDeletionMixin, admin.ModelAdmin):
+    schedule_deletion = staticmethod(schedule_category_deletion)
+    list_display = ['name', 'type', 'user', 'pending_delete', 'created_at']
+    list_filter = ['type', 'pending_delete', 'created_at']
     search_fields = ['name', 'user__username']
 
 
@@ -22,3 +89,10 @@ class BudgetAdmin(admin.ModelAdmin):
     list_display = ['user', 'year', 'month', 'amount', 'created_at']
     list_filter = ['year', 'month', 'created_at']
     search_fields = ['user__username']
+
+
+@admin.register(Job)
+class JobAdmin(admin.ModelAdmin):
+    list_display = ['kind', 'status', 'user', 'estimated_cost', 'progress', 'created_at', 'finished_at']
+    list_filter = ['kind', 'status', 'created_at']
+    search_fields = ['user__username']
@@ -0,0 +1,129 @@
+import numpy as np
+from django.core.cache import cache
+from django.db.models import BigIntegerField, CharField, Count, F, Max
+from django.db.models.functions import Cast, Round
+
+from .models import Category, Transaction
+
+ANALYTICS_CACHE_TIMEOUT = 60 * 60
+WEEKDAYS = ['Mon', 'Tue', 'Wed', 'Thu', 'Fri', 'Sat', 'Sun']
+PERCENTILES = [10, 25, 50, 75, 90]
+
+
+def _period_transactions(user, start=None, end=None):
+    queryset = Transaction.objects.filter(user=user, category__pending_delete=False)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def _data_fingerprint(user, start=None, end=None):
+    """
+    Cheap summary of the rows an analytics result depends on. Any create, edit or delete of a
+    transaction in the period, or any change to the user's categories, changes it, so stale
+    results are never served from a shared or per-process cache.
+    """
+    transactions = _period_transactions(user, start, end).aggregate(count=Count('id'), updated=Max('updated_at'))
+    categories = Category.objects.filter(user=user).aggregate(count=Count('id'), updated=Max('updated_at'))
+    return '{}_{}_{}_{}'.format(
+        transactions['count'],
+        transactions['updated'] and transactions['updated'].timestamp(),
+        categories['count'],
+        categories['updated'] and categories['updated'].timestamp(),
+    )
+
+
+def _grouped_quantiles(sorted_values, starts, counts, q):
+    """Linear-interpolated quantile q (0-1) of each contiguous group in sorted_values"""
+    position = starts + q * (counts - 1)
+    lower = np.floor(position).astype(np.int64)
+    upper = np.ceil(position).astype(np.int64)
+    fraction = position - lower
+    return sorted_values[lower] + (sorted_values[upper] - sorted_values[lower]) * fraction
+
+
+def compute_spending_analytics(user, start=None, end=None):
+    """
+    Per-category spending statistics in integer cents, computed with grouped NumPy operations
+    """
+    queryset = _period_transactions(user, start, end)
+
+    # Dates come back as ISO text and cents as integers, so no per-row date/Decimal objects are built
+    rows = list(queryset.annotate(
+        day=Cast('date', CharField()),
+        cents=Cast(Round(F('amount') * 100), BigIntegerField()),
+    ).values_list('id', 'day', 'cents', 'category_id').order_by())
+
+    if not rows:
+        return {'unit': 'cents', 'categories': [], 'outliers': []}
+
+    ids, dates, cents, category_ids = zip(*rows)
+    ids = np.array(ids, dtype=np.int64)
+    days = np.array(dates, dtype='datetime64[D]')
+    amounts = np.array(cents, dtype=np.int64)
+    category_keys, codes = np.unique(np.array(category_ids, dtype=np.int64), return_inverse=True)
+    groups = len(category_keys)
+
+    # Sort by (category, amount) so each category is a contiguous, ordered run
+    order = np.lexsort((amounts, codes))
+    sorted_amounts = amounts[order].astype(np.float64)
+    counts = np.bincount(codes, minlength=groups)
+    starts = np.concatenate(([0], np.cumsum(counts)[:-1]))
+    totals = np.bincount(codes, weights=amounts, minlength=groups)
+    quantiles = {p: _grouped_quantiles(sorted_amounts, starts, counts, p / 100) for p in PERCENTILES}
+
+    # 1970-01-01 was a Thursday, so shift by 3 to make Monday == 0
+    weekday = (days.astype(np.int64) + 3) % 7
+    month = days.astype('datetime64[M]').astype(np.int64) % 12
+    by_weekday = np.bincount(codes * 7 + weekday, weights=amounts, minlength=groups * 7).reshape(groups, 7)
+    by_month = np.bincount(codes * 12 + month, weights=amounts, minlength=groups * 12).reshape(groups, 12)
+
+    # Tukey fences per category; small categories are too noisy to flag
+    iqr = quantiles[75] - quantiles[25]
+    upper_fence = quantiles[75] + 1.5 * iqr
+    lower_fence = quantiles[25] - 1.5 * iqr
+    flagged = (counts[codes] >= 4) & ((amounts > upper_fence[codes]) | (amounts < lower_fence[codes]))
+
+    category_info = {
+        category_id: (name, category_type)
+        for category_id, name, category_type in Category.objects.filter(
+            user=user, id__in=category_keys.tolist()
+        ).values_list('id', 'name', 'type')
+    }
+
+    categories = []
+    for index, category_id in enumerate(category_keys.tolist()):
+        name, category_type = category_info.get(category_id, (None, None))
+        categories.append({
+            'category_id': category_id,
+            'category': name,
+            'type': category_type,
+            'count': int(counts[index]),
+            'total': int(totals[index]),
+            'mean': int(round(totals[index] / counts[index])),
+            'percentiles': {str(p): int(round(quantiles[p][index])) for p in PERCENTILES},
+            'by_weekday': dict(zip(WEEKDAYS, by_weekday[index].astype(np.int64).tolist())),
+            'by_month': by_month[index].astype(np.int64).tolist(),
+        })
+
+    outliers = [
+        {'id': transaction_id, 'date': str(day), 'amount': amount, 'category_id': int(category_keys[code])}
+        for transaction_id, day, amount, code in zip(
+            ids[flagged].tolist(), days[flagged], amounts[flagged].tolist(), codes[flagged]
+        )
+    ]
+
+    return {'unit': 'cents', 'categories': categories, 'outliers': outliers}
+
+
+def spending_analytics(user, start=None, end=None):
+    """Cached wrapper around compute_spending_analytics, keyed by user, period and data fingerprint"""
+    fingerprint = _data_fingerprint(user, start, end)
+    key = f'analytics_{user.pk}_{start or ""}_{end or ""}_{fingerprint}'
+    result = cache.get(key)
+    if result is None:
+        result = compute_spending_analytics(user, start, end)
+        cache.set(key, result, ANALYTICS_CACHE_TIMEOUT)
+    return result
@@ -0,0 +1,121 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db import transaction
+from django.db.models import Case, DecimalField, F, Sum, When, Window
+from django.db.models.functions import TruncMonth
+
+from .models import BalanceCheckpoint, Transaction, lock_user_balance
+
+INTERVALS = ('day', 'month')
+
+SIGNED_AMOUNT = Case(
+    When(category__type='income', then=F('amount')),
+    default=-F('amount'),
+    output_field=DecimalField(max_digits=14, decimal_places=2),
+)
+
+
+def _visible_transactions(user):
+    return Transaction.objects.filter(user=user, category__pending_delete=False)
+
+
+def _month_end(day):
+    next_month = (day.replace(day=1) + timedelta(days=32)).replace(day=1)
+    return next_month - timedelta(days=1)
+
+
+def signed_amount(amount, category_type):
+    return amount if category_type == 'income' else -amount
+
+
+def adjust_checkpoints(user_id, from_date, delta):
+    """Shift every checkpoint on or after from_date by delta (a transaction was added, changed or removed)"""
+    if delta:
+        BalanceCheckpoint.objects.filter(user_id=user_id, date__gte=from_date).update(
+            balance=F('balance') + delta
+        )
+
+
+def drop_checkpoints(user_id):
+    """Discard a user's checkpoints; they are rebuilt on the next history request"""
+    BalanceCheckpoint.objects.filter(user_id=user_id).delete()
+
+
+def _latest_checkpoint(user, before):
+    return BalanceCheckpoint.objects.filter(user=user, date__lt=before).order_by('-date').first()
+
+
+def ensure_checkpoints(user, before):
+    """
+    Make sure month-end checkpoints exist for every month ending before `before`,
+    extending forward from the latest existing checkpoint with one grouped query.
+    Returns the checkpoint at the end of the month before `before`.
+    """
+    last_month_end = before.replace(day=1) - timedelta(days=1)
+    latest = _latest_checkpoint(user, before)
+    if latest is not None and latest.date >= last_month_end:
+        return latest
+
+    # Transaction writes take the same lock, so none can land between the sum and the insert;
+    # re-read the latest checkpoint under it in case another request just built them
+    with transaction.atomic():
+        lock_user_balance(user.pk)
+        latest = _latest_checkpoint(user, before)
+        if latest is not None and latest.date >= last_month_end:
+            return latest
+
+        transactions = _visible_transactions(user).filter(date__lte=last_month_end)
+        if latest is not None:
+            transactions = transactions.filter(date__gt=latest.date)
+        monthly = transactions.annotate(month=TruncMonth('date')).values_list('month').annotate(
+            net=Sum(SIGNED_AMOUNT)
+        ).order_by('month')
+
+        balance = latest.balance if latest is not None else Decimal('0.00')
+        checkpoints = []
+        for month, net in monthly:
+            balance += net
+            checkpoints.append(BalanceCheckpoint(user=user, date=_month_end(month), balance=balance))
+        # Carry the balance forward through quiet months, so the next read returns before taking the lock
+        if not checkpoints or checkpoints[-1].date < last_month_end:
+            checkpoints.append(BalanceCheckpoint(user=user, date=last_month_end, balance=balance))
+        BalanceCheckpoint.objects.bulk_create(checkpoints, ignore_conflicts=True)
+
+    return BalanceCheckpoint(user=user, date=last_month_end, balance=balance)
+
+
+def balance_history(user, start, end, interval='day'):
+    """
+    Running balance at the end of each day (or month) in [start, end] that has activity.
+    Only rows after the nearest checkpoint before `start` are scanned; the running sum
+    over them is computed in the database with a window function.
+    """
+    checkpoint = ensure_checkpoints(user, start)
+    opening = checkpoint.balance
+    transactions = _visible_transactions(user).filter(date__lte=end, date__gt=checkpoint.date)
+
+    period = F('date') if interval == 'day' else TruncMonth('date')
+    # Rows of the same period are window peers, so each row carries the total through its period's end
+    running = transactions.annotate(period=period).annotate(
+        running=Window(Sum(SIGNED_AMOUNT), order_by=F('period').asc())
+    ).values_list('period', 'running').distinct().order_by('period')
+
+    history = []
+    opening_balance = opening.quantize(Decimal('0.01'))
+    start_period = start if interval == 'day' else start.replace(day=1)
+    for day, total in running:
+        balance = (opening + total).quantize(Decimal('0.01'))
+        if day < start_period:
+            # Rows between the checkpoint and `start` only move the opening balance
+            opening_balance = balance
+            continue
+        history.append({'period': day.isoformat(), 'balance': str(balance)})
+
+    return {
+        'interval': interval,
+        'start': start.isoformat(),
+        'end': end.isoformat(),
+        'opening_balance': str(opening_balance),
+        'history': history,
+    }
@@ -0,0 +1,81 @@
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.db import transaction
+
+from .models import BalanceCheckpoint, Budget, Category, Job, Transaction
+
+
+def _delete_in_chunks(queryset, chunk_size, on_chunk=None):
+    """
+    Delete every row of queryset in primary-key batches of chunk_size, each in its own
+    transaction, so memory use and lock time stay bounded. Returns the number deleted.
+    Each batch goes through the regular collector, so delete signals still fire.
+    """
+    model = queryset.model
+    deleted = 0
+    while True:
+        ids = list(queryset.order_by('pk').values_list('pk', flat=True)[:chunk_size])
+        if not ids:
+            return deleted
+        with transaction.atomic():
+            batch = model.objects.filter(pk__in=ids)
+            if model is Transaction:
+                batch = batch.select_related('category')  # read by the checkpoint signal
+            deleted += batch.delete()[1].get(model._meta.label, 0)
+        if on_chunk:
+            on_chunk(deleted)
+
+
+def _purge_categories(categories, chunk_size, progress, counts):
+    for category_id in categories.values_list('pk', flat=True):
+        base = counts['transactions']
+        counts['transactions'] += _delete_in_chunks(
+            Transaction.objects.filter(category_id=category_id),
+            chunk_size,
+            lambda deleted: progress(dict(counts, transactions=base + deleted)),
+        )
+        Category.objects.filter(pk=category_id).delete()
+        counts['categories'] += 1
+        progress(counts)
+
+
+def delete_category(user, params, progress):
+    category = Category.objects.filter(pk=params['category_id'], pending_delete=True).first()
+    if category is None:
+        return {'transactions': 0, 'categories': 0}
+
+    counts = {'transactions': 0, 'categories': 0}
+    _purge_categories(Category.objects.filter(pk=category.pk), settings.DELETION_CHUNK_SIZE, progress, counts)
+    return counts
+
+
+def delete_user(user, params, progress):
+    target = User.objects.filter(pk=params['user_id'], is_active=False).first()
+    if target is None:
+        return {'transactions': 0, 'categories': 0, 'budgets': 0, 'jobs': 0}
+
+    chunk_size = settings.DELETION_CHUNK_SIZE
+    counts = {'transactions': 0, 'categories': 0, 'budgets': 0, 'jobs': 0}
+    _purge_categories(Category.objects.filter(user=target), chunk_size, progress, counts)
+    counts['budgets'] = _delete_in_chunks(Budget.objects.filter(user=target), chunk_size)
+    counts['jobs'] = _delete_in_chunks(Job.objects.filter(user=target), chunk_size)
+    _delete_in_chunks(BalanceCheckpoint.objects.filter(user=target), chunk_size)
+    progress(counts)
+
+    # Only small rows (admin log entries, group memberships) are left for the collector
+    target.delete()
+    return counts
+
+
+def schedule_category_deletion(category, requested_by):
+    """Hide a category immediately and queue the removal of it and its transactions"""
+    category.pending_delete = True
+    category.save(update_fields=['pending_delete'])
+    return Job.objects.create(user=requested_by, kind='delete_category', params={'category_id': category.pk})
+
+
+def schedule_user_deletion(target, requested_by):
+    """Deactivate a user immediately (blocking login and API access) and queue their removal"""
+    target.is_active = False
+    target.save(update_fields=['is_active'])
+    return Job.objects.create(user=requested_by, kind='delete_user', params={'user_id': target.pk})
@@ -0,0 +1,93 @@
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, TimeoutError
+
+from django.conf import settings
+from django.contrib.auth.hashers import check_password, make_password
+from rest_framework import status
+from rest_framework.exceptions import APIException
+
+
+class HashingUnavailable(APIException):
+    status_code = status.HTTP_503_SERVICE_UNAVAILABLE
+    default_detail = 'Authentication is temporarily overloaded, please retry shortly.'
+    default_code = 'hashing_unavailable'
+    wait = 1
+
+
+_executor = None
+_slots = None
+_lock = threading.Lock()
+_metrics = {'count': 0, 'rejected': 0, 'cpu_seconds': 0.0, 'max_cpu_seconds': 0.0}
+
+
+def _get_executor():
+    # Created lazily so each forked gunicorn worker gets its own threads
+    global _executor, _slots
+    if _executor is None:
+        with _lock:
+            if _executor is None:
+                workers = settings.PASSWORD_HASHING_WORKERS
+                _slots = threading.BoundedSemaphore(workers + settings.PASSWORD_HASHING_QUEUE_SIZE)
+                _executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='password-hashing')
+    return _executor
+
+
+def _timed(func, *args):
+    started = time.thread_time()
+    try:
+        return func(*args)
+    finally:
+        elapsed = time.thread_time() - started
+        with _lock:
+            _metrics['count'] += 1
+            _metrics['cpu_seconds'] += elapsed
+            _metrics['max_cpu_seconds'] = max(_metrics['max_cpu_seconds'], elapsed)
+
+
+def run_hashing(func, *args):
+    """
+    Run a hashing call on the executor and wait for it.
+    Raises HashingUnavailable when the executor and its queue are full or the call times out.
+    """
+    executor = _get_executor()
+    slots = _slots
+    if not slots.acquire(blocking=False):
+        with _lock:
+            _metrics['rejected'] += 1
+        raise HashingUnavailable()
+
+    future = executor.submit(_timed, func, *args)
+    future.add_done_callback(lambda _: slots.release())
+    try:
+        return future.result(timeout=settings.PASSWORD_HASHING_TIMEOUT)
+    except TimeoutError:
+        # A call still waiting in the queue is dropped and frees its slot now;
+        # one already running keeps it until the hash finishes
+        future.cancel()
+        raise HashingUnavailable()
+
+
+def hash_password(password):
+    return run_hashing(make_password, password)
+
+
+def verify_password(user, password):
+    """
+    Check a user's password off the request thread, upgrading the stored hash
+    when PASSWORD_REHASH_ON_LOGIN is enabled and the hasher settings have changed.
+    """
+    needs_rehash = []
+    is_correct = run_hashing(check_password, password, user.password, needs_rehash.append)
+
+    if is_correct and needs_rehash and settings.PASSWORD_REHASH_ON_LOGIN:
+        user.password = hash_password(password)
+        user.save(update_fields=['password'])
+    return is_correct
+
+
+def hashing_metrics():
+    with _lock:
+        metrics = dict(_metrics)
+    metrics['avg_cpu_seconds'] = metrics['cpu_seconds'] / metrics['count'] if metrics['count'] else 0.0
+    return metrics
@@ -0,0 +1,152 @@
+import json
+import logging
+from datetime import timedelta
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models import F
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from .analytics import spending_analytics
+from .deletion import delete_category, delete_user
+from .models import Job
+from .params import parse_period
+from .reports import columnar_daily_stats, daily_stats, monthly_summary
+from .throttles import date_span_cost
+
+logger = logging.getLogger(__name__)
+
+
+def _transaction_stats(user, params, progress):
+    start, end = parse_period(params)
+    if params.get('columnar'):
+        return columnar_daily_stats(user, start, end, fill=bool(params.get('fill')))
+    return daily_stats(user, start, end)
+
+
+def _summary(user, params, progress):
+    return monthly_summary(user, int(params['year']), int(params['month']))
+
+
+def _analytics(user, params, progress):
+    start, end = parse_period(params)
+    return spending_analytics(user, start, end)
+
+
+def _span_cost(params):
+    return date_span_cost(params.get('start'), params.get('end'))
+
+
+# {kind: (handler(user, params, progress) -> JSON-serializable result, cost estimator(params) -> int)}
+JOB_HANDLERS = {
+    'transaction_stats': (_transaction_stats, _span_cost),
+    'summary': (_summary, lambda params: 5),
+    'analytics': (_analytics, _span_cost),
+    'delete_category': (delete_category, lambda params: 1),
+    'delete_user': (delete_user, lambda params: 1),
+}
+
+# Kinds clients may submit through the API; the rest are queued by the server itself
+PUBLIC_JOB_KINDS = ['transaction_stats', 'summary', 'analytics']
+
+
+def estimate_job_cost(kind, params):
+    return JOB_HANDLERS[kind][1](params)
+
+
+def submit_job(user, kind, params, estimated_cost=None):
+    if kind not in JOB_HANDLERS:
+        raise ValueError(f'Unknown job kind: {kind}')
+    if estimated_cost is None:
+        estimated_cost = estimate_job_cost(kind, params)
+    return Job.objects.create(user=user, kind=kind, params=params, estimated_cost=estimated_cost)
+
+
+def should_run_async(request, estimated_cost):
+    """
+    True if the work should be queued: always at or above JOB_INLINE_COST_LIMIT, otherwise when
+    the client asks for ?async=true or the cost reaches JOB_ASYNC_COST_THRESHOLD.
+    ?async=false only keeps work inline below the hard limit.
+    """
+    if estimated_cost >= settings.JOB_INLINE_COST_LIMIT:
+        return True
+    requested = request.query_params.get('async', '').lower()
+    if requested in ('0', 'false', 'no'):
+        return False
+    return requested in ('1', 'true', 'yes') or estimated_cost >= settings.JOB_ASYNC_COST_THRESHOLD
+
+
+def requeue_stale_jobs():
+    """
+    Put running jobs whose worker stopped heartbeating for JOB_STALE_AFTER seconds back in
+    the queue, or fail them once they have been attempted JOB_MAX_ATTEMPTS times.
+    Returns the number requeued.
+    """
+    now = timezone.now()
+    stale = Job.objects.filter(
+        status='running', heartbeat_at__lt=now - timedelta(seconds=settings.JOB_STALE_AFTER)
+    )
+    stale.filter(attempts__gte=settings.JOB_MAX_ATTEMPTS).update(
+        status='failed', error='Worker stopped responding', finished_at=now
+    )
+    return stale.update(status='pending', started_at=None, heartbeat_at=None)
+
+
+def heartbeat_jobs(job_ids):
+    """Mark jobs as still being worked on"""
+    if job_ids:
+        Job.objects.filter(id__in=job_ids, status='running').update(heartbeat_at=timezone.now())
+
+
+def claim_jobs(limit):
+    """
+    Mark up to `limit` pending jobs as running and return their ids.
+
+    Uses SELECT ... FOR UPDATE SKIP LOCKED where supported (Postgres) so concurrent
+    workers never claim the same job; elsewhere (SQLite) each job is claimed with a
+    conditional UPDATE that only one worker can win.
+    """
+    requeue_stale_jobs()
+
+    now = timezone.now()
+    pending = Job.objects.filter(status='pending').order_by('created_at')
+    claim = {'status': 'running', 'started_at': now, 'heartbeat_at': now, 'attempts': F('attempts') + 1}
+
+    if connection.features.has_select_for_update_skip_locked:
+        with transaction.atomic():
+            ids = list(pending.select_for_update(skip_locked=True).values_list('id', flat=True)[:limit])
+            Job.objects.filter(id__in=ids).update(**claim)
+        return ids
+
+    return [
+        job_id for job_id in pending.values_list('id', flat=True)[:limit]
+        if Job.objects.filter(id=job_id, status='pending').update(**claim)
+    ]
+
+
+def run_job(job_id):
+    """Execute a claimed job and store its result or error"""
+    job = Job.objects.select_related('user').filter(id=job_id).first()
+    if job is None:
+        return None
+    handler = JOB_HANDLERS[job.kind][0]
+
+    def progress(data):
+        Job.objects.filter(id=job_id).update(progress=data, heartbeat_at=timezone.now())
+
+    result, error = None, ''
+    try:
+        # Round-trip through DRF's encoder so stored results match what the inline endpoint renders
+        result = json.loads(JSONRenderer().render(handler(job.user, job.params, progress)))
+        status = 'succeeded'
+    except Exception as e:
+        logger.exception('Job %s (%s) failed', job.id, job.kind)
+        error = str(e)
+        status = 'failed'
+
+    # update() rather than save(): a deletion job may have removed its own row along with its user
+    Job.objects.filter(id=job_id).update(
+        result=result, status=status, error=error, finished_at=timezone.now()
+    )
+    return status
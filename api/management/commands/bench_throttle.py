@@ -0,0 +1,50 @@
+import time
+
+from django.conf import settings
+from django.contrib.auth.models import User
+from django.core.management.base import BaseCommand
+from rest_framework.test import APIRequestFactory
+from rest_framework.request import Request
+
+from api.throttles import CostBasedThrottle
+from api.views import TransactionViewSet
+
+
+class Command(BaseCommand):
+    help = (
+        'Measure the per-request overhead of CostBasedThrottle against the configured default cache; '
+        'run with --settings=budget_tracker.settings_production and REDIS_URL to match a deployment'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=20000)
+
+    def handle(self, *args, **options):
+        iterations = options['iterations']
+        # An allowed request costs four cache round trips (add lock, get, set, delete lock)
+        self.stdout.write(f"cache backend: {settings.CACHES['default']['BACKEND']}")
+        factory = APIRequestFactory()
+
+        http_request = factory.get('/api/transactions/stats/', {'start': '2024-01-01', 'end': '2024-12-31'})
+        request = Request(http_request)
+        request.user = User(pk=0, username='bench')
+
+        view = TransactionViewSet()
+        view.action = 'stats'
+
+        throttle = CostBasedThrottle()
+        throttle.num_requests = throttle.duration = 10 ** 12  # never run out
+        self._run(throttle, request, view, iterations, 'allowed (shared cache)')
+
+        throttle = CostBasedThrottle()
+        throttle.num_requests, throttle.duration = 1, 3600
+        throttle.allow_request(request, view)
+        self._run(throttle, request, view, iterations, 'rejected (in-process fast path)')
+        CostBasedThrottle._local_buckets.clear()
+
+    def _run(self, throttle, request, view, iterations, label):
+        started = time.perf_counter()
+        for _ in range(iterations):
+            throttle.allow_request(request, view)
+        elapsed = time.perf_counter() - started
+        self.stdout.write(f'{label}: {elapsed / iterations * 1e6:.2f} us/request')
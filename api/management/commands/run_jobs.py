@@ -0,0 +1,80 @@
+import logging
+import multiprocessing
+import time
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor, wait, FIRST_COMPLETED
+
+import django
+from django.core.management.base import BaseCommand
+from django.db import close_old_connections
+
+logger = logging.getLogger(__name__)
+
+
+def _init_process():
+    # Spawned workers start from a clean interpreter with no inherited DB connections
+    django.setup()
+
+
+def _execute(job_id):
+    # Imported lazily so spawned processes can unpickle this function before django.setup()
+    from api.jobs import run_job
+
+    try:
+        return run_job(job_id)
+    finally:
+        close_old_connections()
+
+
+class Command(BaseCommand):
+    help = 'Run queued background jobs (heavy reports) outside the request workers'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=2, help='Number of jobs to run concurrently')
+        parser.add_argument('--processes', action='store_true', help='Use a process pool instead of threads')
+        parser.add_argument('--poll-interval', type=float, default=1.0, help='Seconds to sleep when the queue is empty')
+        parser.add_argument('--once', action='store_true', help='Drain the queue once and exit')
+
+    def handle(self, *args, **options):
+        from api.jobs import claim_jobs, heartbeat_jobs
+
+        workers = options['workers']
+        if options['processes']:
+            executor = ProcessPoolExecutor(
+                max_workers=workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_process,
+            )
+        else:
+            executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix='job')
+
+        running = {}  # {future: job_id}
+        with executor:
+            while True:
+                # Database errors here must not kill the worker and strand the jobs it holds
+                try:
+                    heartbeat_jobs(list(running.values()))
+                    free = workers - len(running)
+                    job_ids = claim_jobs(free) if free else []
+                except Exception:
+                    logger.exception('Failed to poll the job queue')
+                    close_old_connections()
+                    job_ids = []
+
+                for job_id in job_ids:
+                    running[executor.submit(_execute, job_id)] = job_id
+                    self.stdout.write(f'Started job {job_id}')
+
+                if not running:
+                    if options['once']:
+                        break
+                    time.sleep(options['poll_interval'])
+                    continue
+
+                done, _ = wait(running, timeout=options['poll_interval'], return_when=FIRST_COMPLETED)
+                for future in done:
+                    job_id = running.pop(future)
+                    try:
+                        future.result()
+                    except Exception:
+                        # Left running; requeue_stale_jobs retries it once its heartbeat expires
+                        logger.exception('Job %s crashed outside its handler', job_id)
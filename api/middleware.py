@@ -0,0 +1,23 @@
+from django.http import HttpResponse
+
+from .hashing import HashingUnavailable
+
+
+class HashingUnavailableMiddleware:
+    """
+    Turn hashing saturation outside DRF views (admin and session login go through the same
+    authentication backend) into a 503 with Retry-After instead of an unhandled exception
+    """
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+
+    def __call__(self, request):
+        return self.get_response(request)
+
+    def process_exception(self, request, exception):
+        if isinstance(exception, HashingUnavailable):
+            response = HttpResponse(str(exception.detail), status=exception.status_code, content_type='text/plain')
+            response['Retry-After'] = str(exception.wait)
+            return response
+        return None
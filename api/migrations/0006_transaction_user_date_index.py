@@ -0,0 +1,17 @@
+# Generated by Django 4.2.7 on 2026-10-19 19:59
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('api', '0005_job_lease'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='transaction',
+            index=models.Index(fields=['user', 'date'], name='api_transac_user_id_aacb53_idx'),
+        ),
+    ]
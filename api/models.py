@@ -1,8 +1,17 @@
-from django.db import models
+from django.db import models, transaction
 from django.contrib.auth.models import User
+from django.core.serializers.json import DjangoJSONEncoder
 from decimal import Decimal
 
 
+def lock_user_balance(user_id):
+    """
+    Lock the owner's row until the surrounding transaction ends, so balance checkpoint
+    maintenance (api/balance.py, api/signals.py) for one user never interleaves
+    """
+    list(User.objects.select_for_update().filter(pk=user_id).values_list('pk', flat=True))
+
+
 class Category(models.Model):
     TYPE_CHOICES = [
         ('income', 'Income'),
@@ -12,6 +21,7 @@ class Category(models.Model):
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='categories')
     name = models.CharField(max_length=100)
     type = models.CharField(max_length=10, choices=TYPE_CHOICES)
+    pending_delete = models.BooleanField(default=False)  # Hidden while a background job removes it
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
     
@@ -22,6 +32,12 @@ class Category(models.Model):
     
     def __str__(self):
         return f"{self.name} ({self.type})"
+    
+    def save(self, *args, **kwargs):
+        # Type/visibility changes drop the owner's checkpoints in post_save
+        with transaction.atomic():
+            lock_user_balance(self.user_id)
+            super().save(*args, **kwargs)
 
 
 class Transaction(models.Model):
@@ -35,6 +51,7 @@ class Transaction(models.Model):
     
     class Meta:
         ordering = ['-date', '-created_at']
+        indexes = [models.Index(fields=['user', 'date'])]
     
     def __str__(self):
         return f"{self.category.name}: ${self.amount} on {self.date}"
@@ -43,7 +60,15 @@ class Transaction(models.Model):
         # Ensure amount is positive
         if self.amount <= 0:
             raise ValueError("Transaction amount must be positive")
-        super().save(*args, **kwargs)
+        # The checkpoint adjustment in post_save must commit together with the row
+        with transaction.atomic():
+            lock_user_balance(self.user_id)
+            super().save(*args, **kwargs)
+    
+    def delete(self, *args, **kwargs):
+        with transaction.atomic():
+            lock_user_balance(self.user_id)
+            return super().delete(*args, **kwargs)
 
 
 class Budget(models.Model):
@@ -65,3 +90,47 @@ class Budget(models.Model):
         if not 1 <= self.month <= 12:
             raise ValueError("Month must be between 1 and 12")
         super().save(*args, **kwargs)
+
+
+class Job(models.Model):
+    STATUS_CHOICES = [
+        ('pending', 'Pending'),
+        ('running', 'Running'),
+        ('succeeded', 'Succeeded'),
+        ('failed', 'Failed'),
+    ]
+    
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='jobs')
+    kind = models.CharField(max_length=50)
+    params = models.JSONField(default=dict, blank=True)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default='pending')
+    estimated_cost = models.IntegerField(default=1)
+    attempts = models.IntegerField(default=0)
+    progress = models.JSONField(default=dict, blank=True)
+    result = models.JSONField(null=True, blank=True, encoder=DjangoJSONEncoder)
+    error = models.TextField(blank=True)
+    created_at = models.DateTimeField(auto_now_add=True)
+    started_at = models.DateTimeField(null=True, blank=True)
+    heartbeat_at = models.DateTimeField(null=True, blank=True)  # Refreshed by the worker while running
+    finished_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        ordering = ['-created_at']
+        indexes = [models.Index(fields=['status', 'created_at'])]
+    
+    def __str__(self):
+        return f"Job {self.pk} {self.kind} ({self.status})"
+
+
+class BalanceCheckpoint(models.Model):
+    """Cumulative balance (income minus expenses) of a user through the end of `date`"""
+    user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='balance_checkpoints')
+    date = models.DateField()
+    balance = models.DecimalField(max_digits=14, decimal_places=2)
+    
+    class Meta:
+        unique_together = ['user', 'date']
+        ordering = ['-date']
+    
+    def __str__(self):
+        return f"Balance through {self.date}: ${self.balance}"
@@ -0,0 +1,59 @@
+from django.utils.dateparse import parse_date
+
+# Longest range that columnar stats will zero-fill day by day (about ten years)
+MAX_FILL_DAYS = 3660
+
+
+def parse_optional_date(value, name):
+    """
+    Parse an optional ISO date given as a string.
+    Raises ValueError if a value is present but is not a valid date string.
+    """
+    if value in (None, ''):
+        return None
+    if not isinstance(value, str):
+        raise ValueError(f'Invalid {name} date')
+    try:
+        parsed = parse_date(value)
+    except ValueError:
+        parsed = None
+    if parsed is None:
+        raise ValueError(f'Invalid {name} date')
+    return parsed
+
+
+def parse_period(data):
+    """
+    Parse the optional start/end entries of a mapping (query params or job params) into dates.
+    Raises ValueError if either is present but not a valid date.
+    """
+    return parse_optional_date(data.get('start'), 'start'), parse_optional_date(data.get('end'), 'end')
+
+
+def parse_year_month(data, default_year=None, default_month=None):
+    """
+    Parse year/month entries into ints. Raises ValueError if they are missing or invalid.
+    """
+    year = data.get('year', default_year)
+    month = data.get('month', default_month)
+    try:
+        year = int(year)
+        month = int(month)
+    except (ValueError, TypeError):
+        raise ValueError('Invalid year or month')
+    if not 1 <= month <= 12:
+        raise ValueError('Invalid year or month')
+    return year, month
+
+
+def parse_flag(value):
+    """Interpret a query/job parameter as a boolean"""
+    if isinstance(value, bool):
+        return value
+    return str(value).lower() in ('1', 'true', 'yes')
+
+
+def check_fill_span(start, end):
+    """Raise ValueError if zero-filling every day from start to end would exceed MAX_FILL_DAYS"""
+    if start and end and (end - start).days + 1 > MAX_FILL_DAYS:
+        raise ValueError(f'Gap filling is limited to {MAX_FILL_DAYS} days; narrow start/end')
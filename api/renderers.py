@@ -0,0 +1,42 @@
+from rest_framework.renderers import BaseRenderer, JSONRenderer
+from rest_framework.settings import api_settings
+
+try:
+    import msgpack
+except ImportError:  # msgpack is optional; the columnar JSON format still works without it
+    msgpack = None
+
+
+class ColumnarJSONRenderer(JSONRenderer):
+    """
+    JSON renderer for compact time-series payloads (parallel arrays instead of row objects)
+    """
+    media_type = 'application/vnd.budget.columnar+json'
+    format = 'columnar'
+    compact = True
+
+
+class MessagePackRenderer(BaseRenderer):
+    """
+    Binary renderer for the same columnar payloads, selected with ?format=msgpack
+    """
+    media_type = 'application/x-msgpack'
+    format = 'msgpack'
+    charset = None
+    render_style = 'binary'
+
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if data is None:
+            return b''
+        return msgpack.packb(data, use_bin_type=True, default=str)
+
+
+COLUMNAR_FORMATS = {ColumnarJSONRenderer.format, MessagePackRenderer.format}
+
+
+def columnar_renderer_classes():
+    """Renderers offered by time-series endpoints, in addition to the defaults"""
+    renderers = list(api_settings.DEFAULT_RENDERER_CLASSES) + [ColumnarJSONRenderer]
+    if msgpack is not None:
+        renderers.append(MessagePackRenderer)
+    return renderers
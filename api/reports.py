@@ -0,0 +1,114 @@
+from datetime import timedelta
+from decimal import Decimal
+
+from django.db.models import Q, Sum
+
+from .models import Budget, Transaction
+from .params import check_fill_span
+from .serializers import SummarySerializer
+
+
+def to_cents(amount):
+    return int(round(amount * 100)) if amount is not None else 0
+
+
+def _transactions_in_period(user, start=None, end=None):
+    queryset = Transaction.objects.filter(user=user, category__pending_delete=False)
+    if start:
+        queryset = queryset.filter(date__gte=start)
+    if end:
+        queryset = queryset.filter(date__lte=end)
+    return queryset
+
+
+def daily_stats(user, start=None, end=None):
+    """Daily income/expense totals as a list of {day, total_income, total_expenses}"""
+    queryset = _transactions_in_period(user, start, end)
+    return list(queryset.extra(
+        select={'day': 'date'}
+    ).values('day').annotate(
+        total_income=Sum('amount', filter=Q(category__type='income')),
+        total_expenses=Sum('amount', filter=Q(category__type='expense'))
+    ).order_by('day'))
+
+
+def columnar_daily_stats(user, start=None, end=None, fill=False):
+    """
+    Build daily income/expense totals as parallel arrays of ISO dates and integer cents.
+    With fill=True every day between start and end is present, zero-filled; raises ValueError
+    if that span (taken from the data when start/end are missing) exceeds MAX_FILL_DAYS.
+    """
+    rows = _transactions_in_period(user, start, end).values_list('date').annotate(
+        total_income=Sum('amount', filter=Q(category__type='income')),
+        total_expenses=Sum('amount', filter=Q(category__type='expense'))
+    ).order_by('date')
+
+    totals = {day: (to_cents(income), to_cents(expenses)) for day, income, expenses in rows}
+
+    if fill and (totals or (start and end)):
+        first = start or min(totals)
+        last = end or max(totals)
+        check_fill_span(first, last)
+        days = [first + timedelta(days=offset) for offset in range((last - first).days + 1)]
+    else:
+        days = list(totals)
+
+    empty = (0, 0)
+    return {
+        'unit': 'cents',
+        'days': [day.isoformat() for day in days],
+        'income': [totals.get(day, empty)[0] for day in days],
+        'expenses': [totals.get(day, empty)[1] for day in days],
+    }
+
+
+def monthly_summary(user, year, month):
+    """Dashboard summary (totals, per-transaction category breakdown, budget) for one month"""
+    # Get transactions for the specified month
+    transactions = Transaction.objects.filter(
+        user=user,
+        category__pending_delete=False,
+        date__year=year,
+        date__month=month
+    ).select_related('category')
+    
+    # Calculate totals
+    total_income = transactions.filter(category__type='income').aggregate(
+        total=Sum('amount')
+    )['total'] or Decimal('0.00')
+    
+    total_expenses = transactions.filter(category__type='expense').aggregate(
+        total=Sum('amount')
+    )['total'] or Decimal('0.00')
+    
+    balance = total_income - total_expenses
+    
+    # Get breakdown by category
+    by_category = []
+    for transaction in transactions:
+        category_data = {
+            'category': transaction.category.name,
+            'type': transaction.category.type,
+            'amount': str(transaction.amount)
+        }
+        by_category.append(category_data)
+    
+    # Get monthly budget
+    try:
+        budget = Budget.objects.get(user=user, year=year, month=month)
+        monthly_budget = budget.amount
+        budget_variance = monthly_budget - total_expenses
+    except Budget.DoesNotExist:
+        monthly_budget = None
+        budget_variance = None
+    
+    summary_data = {
+        'total_income': str(total_income),
+        'total_expenses': str(total_expenses),
+        'balance': str(balance),
+        'by_category': by_category,
+        'monthly_budget': str(monthly_budget) if monthly_budget else None,
+        'budget_variance': str(budget_variance) if budget_variance is not None else None,
+    }
+    
+    return SummarySerializer(summary_data).data
@@ -1,6 +1,7 @@
 from rest_framework import serializers
 from django.contrib.auth.models import User
-from .models import Category, Transaction, Budget
+from .models import Category, Transaction, Budget, Job
+from .params import check_fill_span, parse_flag, parse_period, parse_year_month
 
 
 class UserSerializer(serializers.ModelSerializer):
@@ -52,6 +53,8 @@ class TransactionSerializer(serializers.ModelSerializer):
         # Ensure category belongs to the current user
         if value.user != self.context['request'].user:
             raise serializers.ValidationError("You can only use your own categories.")
+        if value.pending_delete:
+            raise serializers.ValidationError("This category is being deleted.")
         return value
     
     def create(self, validated_data):
@@ -91,3 +94,39 @@ class SummarySerializer(serializers.Serializer):
     )
     monthly_budget = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
     budget_variance = serializers.DecimalField(max_digits=12, decimal_places=2, allow_null=True)
+
+
+class JobSerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Job
+        fields = ['id', 'kind', 'params', 'status', 'estimated_cost', 'attempts', 'progress', 'error', 'created_at', 'started_at', 'finished_at']
+        read_only_fields = ['status', 'estimated_cost', 'attempts', 'progress', 'error', 'created_at', 'started_at', 'finished_at']
+    
+    def validate_kind(self, value):
+        from .jobs import PUBLIC_JOB_KINDS
+        if value not in PUBLIC_JOB_KINDS:
+            raise serializers.ValidationError(f"Unknown job kind. Choose from: {', '.join(PUBLIC_JOB_KINDS)}.")
+        return value
+    
+    def validate(self, attrs):
+        # Normalize params per kind so the worker never sees malformed input
+        kind = attrs['kind']
+        params = attrs.get('params', {})
+        if not isinstance(params, dict):
+            raise serializers.ValidationError({'params': 'Params must be an object.'})
+        try:
+            if kind == 'summary':
+                year, month = parse_year_month(params)
+                normalized = {'year': year, 'month': month}
+            else:
+                start, end = parse_period(params)
+                normalized = {'start': start and start.isoformat(), 'end': end and end.isoformat()}
+                if kind == 'transaction_stats':
+                    normalized['columnar'] = parse_flag(params.get('columnar', False))
+                    normalized['fill'] = parse_flag(params.get('fill', False))
+                    if normalized['columnar'] and normalized['fill']:
+                        check_fill_span(start, end)
+        except ValueError as e:
+            raise serializers.ValidationError({'params': str(e)})
+        attrs['params'] = normalized
+        return attrs
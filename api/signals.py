@@ -0,0 +1,47 @@
+from django.db.models.signals import post_delete, post_save, pre_save
+from django.dispatch import receiver
+
+from .balance import adjust_checkpoints, drop_checkpoints, signed_amount
+from .models import Category, Transaction
+
+
+@receiver(pre_save, sender=Transaction)
+def remember_previous_transaction(sender, instance, **kwargs):
+    # Keep the stored amount/date/type so post_save can reverse them on the checkpoints
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Transaction.objects.filter(pk=instance.pk).values_list(
+            'amount', 'date', 'category__type', 'user_id'
+        ).first()
+
+
+@receiver(post_save, sender=Transaction)
+def update_checkpoints_on_save(sender, instance, **kwargs):
+    previous = getattr(instance, '_previous', None)
+    if previous is not None:
+        amount, day, category_type, user_id = previous
+        adjust_checkpoints(user_id, day, -signed_amount(amount, category_type))
+    adjust_checkpoints(instance.user_id, instance.date, signed_amount(instance.amount, instance.category.type))
+
+
+@receiver(post_delete, sender=Transaction)
+def update_checkpoints_on_delete(sender, instance, **kwargs):
+    # Checkpoints already leave out transactions of categories pending deletion
+    if instance.category.pending_delete:
+        return
+    adjust_checkpoints(instance.user_id, instance.date, -signed_amount(instance.amount, instance.category.type))
+
+
+@receiver(pre_save, sender=Category)
+def remember_previous_category(sender, instance, **kwargs):
+    instance._previous = None
+    if instance.pk:
+        instance._previous = Category.objects.filter(pk=instance.pk).values_list('type', 'pending_delete').first()
+
+
+@receiver(post_save, sender=Category)
+def drop_checkpoints_on_category_change(sender, instance, created, **kwargs):
+    # A type change flips the sign of every transaction, and pending_delete hides them
+    previous = getattr(instance, '_previous', None)
+    if previous is not None and previous != (instance.type, instance.pending_delete):
+        drop_checkpoints(instance.user_id)
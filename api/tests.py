@@ -0,0 +1,489 @@
+import calendar
+import json
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date, timedelta
+from decimal import Decimal
+import threading
+import time
+from unittest import mock
+
+import msgpack
+
+from django.contrib.admin.models import CHANGE, LogEntry
+from django.contrib.auth import authenticate
+from django.contrib.auth.hashers import make_password
+from django.contrib.auth.models import User
+from django.core.cache import cache
+from django.test import TestCase, override_settings
+from django.urls import reverse
+from rest_framework.test import APIClient
+from django.utils import timezone
+
+from . import hashing
+from .analytics import spending_analytics
+from .balance import balance_history, ensure_checkpoints
+from .deletion import schedule_category_deletion, schedule_user_deletion
+from .jobs import claim_jobs, run_job
+from .models import BalanceCheckpoint, Budget, Category, Job, Transaction
+from .throttles import CostBasedThrottle
+
+
+class ClaimJobsTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('owner', 'owner@example.com', 'password')
+        self.jobs = [
+            Job.objects.create(user=self.user, kind='summary', params={'year': 2024, 'month': 1})
+            for _ in range(3)
+        ]
+
+    def test_jobs_are_handed_out_once(self):
+        first = claim_jobs(2)
+        second = claim_jobs(5)
+
+        self.assertEqual(len(first), 2)
+        self.assertEqual(set(first) & set(second), set())
+        self.assertEqual(set(first) | set(second), {job.pk for job in self.jobs})
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(Job.objects.filter(status='running', attempts=1).count(), 3)
+
+    def test_job_claimed_by_another_worker_is_skipped(self):
+        contested = self.jobs[0].pk
+        original_filter = Job.objects.filter
+
+        def racing_filter(*args, **kwargs):
+            # Another worker claims the job between our read of pending ids and our update
+            if kwargs.get('id') == contested and kwargs.get('status') == 'pending':
+                original_filter(pk=contested).update(status='running')
+            return original_filter(*args, **kwargs)
+
+        with mock.patch.object(Job.objects, 'filter', side_effect=racing_filter):
+            claimed = claim_jobs(5)
+
+        self.assertNotIn(self.jobs[0].pk, claimed)
+        self.assertEqual(len(claimed), 2)
+
+    @override_settings(JOB_STALE_AFTER=60, JOB_MAX_ATTEMPTS=2)
+    def test_stale_running_jobs_are_requeued_then_failed(self):
+        claim_jobs(5)
+        stale = timezone.now() - timedelta(seconds=120)
+        Job.objects.update(heartbeat_at=stale)
+
+        self.assertEqual(len(claim_jobs(5)), 3)
+
+        Job.objects.update(heartbeat_at=stale)
+        self.assertEqual(claim_jobs(5), [])
+        self.assertEqual(Job.objects.filter(status='failed').count(), 3)
+
+
+class CostBasedThrottleTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        CostBasedThrottle._local_buckets.clear()
+        self.user = User.objects.create_user('spender', 'spender@example.com', 'password')
+        self.request = mock.Mock(user=self.user)
+
+    def allow(self, cost):
+        throttle = CostBasedThrottle()
+        throttle.num_requests, throttle.duration = 100, 3600
+        return throttle.allow_request(self.request, mock.Mock(spec=['throttle_cost'], throttle_cost=cost))
+
+    def test_rejected_expensive_request_does_not_block_cheap_ones(self):
+        self.assertTrue(self.allow(90))
+        self.assertFalse(self.allow(50))
+        self.assertTrue(self.allow(1))
+
+    def test_costs_above_capacity_leave_the_bucket_in_debt(self):
+        self.assertTrue(self.allow(250))
+        self.assertFalse(self.allow(1))
+
+    def test_threads_sharing_a_fast_path_snapshot_do_not_fail(self):
+        key = CostBasedThrottle.cache_format % {'scope': 'cost', 'ident': self.user.pk}
+        CostBasedThrottle._local_buckets[key] = (100, 0)
+        barrier, seen = threading.Barrier(4), threading.local()
+        refill = CostBasedThrottle._refill
+
+        def refill_after_every_thread_read_the_snapshot(throttle, tokens, updated_at):
+            if not getattr(seen, 'snapshot', False):
+                seen.snapshot = True
+                barrier.wait(timeout=5)
+            return refill(throttle, tokens, updated_at)
+
+        errors = []
+
+        def request():
+            try:
+                self.allow(1)
+            except Exception as e:
+                errors.append(e)
+
+        with mock.patch.object(CostBasedThrottle, '_refill', refill_after_every_thread_read_the_snapshot):
+            threads = [threading.Thread(target=request) for _ in range(4)]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+        self.assertEqual(errors, [])
+
+    def test_parallel_requests_cannot_spend_the_same_tokens(self):
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            allowed = list(executor.map(lambda _: self.allow(10), range(20)))
+        self.assertEqual(allowed.count(True), 10)
+
+
+class SpendingAnalyticsCacheTests(TestCase):
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('analyst', 'analyst@example.com', 'password')
+        self.category = Category.objects.create(user=self.user, name='Food', type='expense')
+
+    def add(self, amount, day):
+        return Transaction.objects.create(user=self.user, category=self.category, amount=amount, date=day)
+
+    def totals(self):
+        return [category['total'] for category in spending_analytics(self.user)['categories']]
+
+    def test_changes_are_visible_without_any_invalidation(self):
+        first = self.add(Decimal('10'), date(2024, 1, 1))
+        self.add(Decimal('5'), date(2024, 1, 2))
+        self.assertEqual(self.totals(), [1500])
+
+        first.amount = Decimal('12')
+        first.save()
+        self.assertEqual(self.totals(), [1700])
+
+        first.delete()
+        self.assertEqual(self.totals(), [500])
+
+        self.category.pending_delete = True
+        self.category.save(update_fields=['pending_delete'])
+        self.assertEqual(self.totals(), [])
+
+
+@override_settings(DELETION_CHUNK_SIZE=2)
+class BackgroundDeletionTests(TestCase):
+    def setUp(self):
+        self.admin = User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.target = User.objects.create_user('leaving', 'leaving@example.com', 'password')
+        self.food = Category.objects.create(user=self.target, name='Food', type='expense')
+        self.salary = Category.objects.create(user=self.target, name='Salary', type='income')
+        for day in range(1, 6):
+            for category, amount, month in ((self.food, '3', 1), (self.salary, '9', 2)):
+                Transaction.objects.create(
+                    user=self.target, category=category, amount=Decimal(amount), date=date(2024, month, day)
+                )
+        Budget.objects.create(user=self.target, year=2024, month=1, amount=Decimal('100'))
+        Job.objects.create(user=self.target, kind='summary', params={'year': 2024, 'month': 1})
+        ensure_checkpoints(self.target, date(2024, 3, 1))
+
+    def test_delete_user_job_removes_every_dependent_row(self):
+        job = schedule_user_deletion(self.target, self.admin)
+        self.assertEqual(run_job(job.id), 'succeeded')
+
+        self.assertFalse(User.objects.filter(pk=self.target.pk).exists())
+        for model in (Transaction, Category, Budget, Job, BalanceCheckpoint):
+            self.assertFalse(model.objects.filter(user_id=self.target.pk).exists(), model.__name__)
+        job.refresh_from_db()
+        self.assertEqual(job.result, {'transactions': 10, 'categories': 2, 'budgets': 1, 'jobs': 1})
+
+    def test_delete_category_job_removes_only_that_category(self):
+        job = schedule_category_deletion(self.food, self.admin)
+        self.assertEqual(run_job(job.id), 'succeeded')
+
+        self.assertFalse(Category.objects.filter(pk=self.food.pk).exists())
+        self.assertFalse(Transaction.objects.filter(category_id=self.food.pk).exists())
+        self.assertEqual(Transaction.objects.filter(category=self.salary).count(), 5)
+
+    def test_admin_reports_deletion_as_scheduled(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:api_category_delete', args=[self.food.pk])
+        response = self.client.post(url, {'post': 'yes'}, follow=True)
+        self.assertContains(response, 'Deletion of Food')
+        self.assertNotContains(response, 'deleted successfully')
+
+        response = self.client.post(
+            reverse('admin:api_category_changelist'),
+            {'action': 'delete_selected', '_selected_action': [self.salary.pk], 'post': 'yes'},
+            follow=True,
+        )
+        self.assertContains(response, 'Deletion of 1 categories has been scheduled.')
+        self.assertEqual(
+            LogEntry.objects.filter(action_flag=CHANGE, change_message='Deletion scheduled.').count(), 2
+        )
+        self.assertEqual(Job.objects.filter(kind='delete_category').count(), 2)
+
+    def test_user_admin_schedules_deletion(self):
+        self.client.force_login(self.admin)
+        url = reverse('admin:auth_user_delete', args=[self.target.pk])
+        response = self.client.post(url, {'post': 'yes'}, follow=True)
+        self.assertContains(response, 'Deletion of leaving has been scheduled.')
+        self.assertNotContains(response, 'deleted successfully')
+
+        self.target.refresh_from_db()
+        self.assertFalse(self.target.is_active)
+        self.assertTrue(LogEntry.objects.filter(object_id=str(self.target.pk), action_flag=CHANGE).exists())
+        job = Job.objects.get(kind='delete_user', params={'user_id': self.target.pk})
+        self.assertEqual(run_job(job.id), 'succeeded')
+        self.assertFalse(User.objects.filter(pk=self.target.pk).exists())
+
+    def test_checkpoints_rebuilt_while_a_category_is_pending_stay_correct(self):
+        job = schedule_category_deletion(self.food, self.admin)
+        ensure_checkpoints(self.target, date(2024, 3, 1))  # rebuilt without the hidden category
+        self.assertEqual(run_job(job.id), 'succeeded')
+        self.assertEqual(
+            list(BalanceCheckpoint.objects.filter(user=self.target).values_list('date', 'balance')),
+            [(date(2024, 2, 29), Decimal('45.00'))],
+        )
+
+
+class BalanceCheckpointTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('saver', 'saver@example.com', 'password')
+        self.food = Category.objects.create(user=self.user, name='Food', type='expense')
+        self.salary = Category.objects.create(user=self.user, name='Salary', type='income')
+        self.transactions = [
+            Transaction.objects.create(
+                user=self.user, category=category, amount=Decimal(amount), date=date(2024, month, 10)
+            )
+            for category, amount, month in (
+                (self.salary, '1000', 1), (self.food, '120.50', 1), (self.food, '80', 2), (self.salary, '900', 3),
+            )
+        ]
+        ensure_checkpoints(self.user, date(2024, 6, 1))
+
+    def assertCheckpointsMatchTransactions(self):
+        checkpoints = BalanceCheckpoint.objects.filter(user=self.user)
+        self.assertTrue(checkpoints.exists())
+        for checkpoint in checkpoints:
+            expected = sum(
+                (t.amount if t.category.type == 'income' else -t.amount
+                 for t in Transaction.objects.filter(user=self.user, date__lte=checkpoint.date)),
+                Decimal('0'),
+            )
+            self.assertEqual(checkpoint.balance, expected, checkpoint.date)
+
+    def balance_through(self, day):
+        return sum(
+            (t.amount if t.category.type == 'income' else -t.amount
+             for t in Transaction.objects.filter(user=self.user, date__lte=day)),
+            Decimal('0'),
+        )
+
+    def test_quiet_months_are_carried_forward(self):
+        carried = BalanceCheckpoint.objects.get(user=self.user, date=date(2024, 5, 31))
+        self.assertEqual(carried.balance, Decimal('1699.50'))
+        with mock.patch('api.balance.lock_user_balance') as lock:
+            ensure_checkpoints(self.user, date(2024, 6, 15))
+        lock.assert_not_called()
+
+    def test_balance_history_matches_brute_force(self):
+        for amount, day in (('7.25', date(2024, 2, 10)), ('3', date(2024, 7, 2))):
+            Transaction.objects.create(user=self.user, category=self.food, amount=Decimal(amount), date=day)
+        for interval, start in (('day', date(2024, 2, 5)), ('month', date(2024, 2, 5)), ('day', date(2024, 8, 1))):
+            with self.subTest(interval=interval, start=start):
+                result = balance_history(self.user, start, date(2024, 12, 31), interval)
+                self.assertEqual(Decimal(result['opening_balance']), self.balance_through(start - timedelta(days=1)))
+                for point in result['history']:
+                    period = date.fromisoformat(point['period'])
+                    if interval == 'month':
+                        period = period.replace(day=calendar.monthrange(period.year, period.month)[1])
+                    self.assertEqual(Decimal(point['balance']), self.balance_through(period), period)
+                expected_periods = {
+                    t.date if interval == 'day' else t.date.replace(day=1)
+                    for t in Transaction.objects.filter(user=self.user, date__gte=start)
+                }
+                self.assertEqual({date.fromisoformat(p['period']) for p in result['history']}, expected_periods)
+
+    def test_edited_transaction(self):
+        edited = self.transactions[1]
+        edited.amount = Decimal('20')
+        edited.date = date(2024, 3, 1)
+        edited.save()
+        self.assertCheckpointsMatchTransactions()
+
+    def test_transaction_moved_to_another_category(self):
+        moved = self.transactions[2]
+        moved.category = self.salary
+        moved.save()
+        self.assertCheckpointsMatchTransactions()
+
+    def test_deleted_transaction(self):
+        self.transactions[0].delete()
+        self.assertCheckpointsMatchTransactions()
+
+    def test_only_type_or_visibility_changes_drop_checkpoints(self):
+        self.food.name = 'Groceries'
+        self.food.save()
+        self.assertTrue(BalanceCheckpoint.objects.filter(user=self.user).exists())
+
+        self.food.type = 'income'
+        self.food.save()
+        self.assertFalse(BalanceCheckpoint.objects.filter(user=self.user).exists())
+
+
+class AsyncJobFormatTests(TestCase):
+    def setUp(self):
+        self.user = User.objects.create_user('poller', 'poller@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+
+    def test_columnar_clients_can_follow_their_202(self):
+        for fmt in ('columnar', 'msgpack'):
+            response = self.client.get(
+                '/api/transactions/stats/', {'start': '2024-01-01', 'end': '2024-01-31', 'async': 'true', 'format': fmt}
+            )
+            self.assertEqual(response.status_code, 202)
+            self.assertNotIn('format', response['Location'])
+            self.assertEqual(self.client.get(response['Location']).status_code, 200)
+
+    def test_result_is_offered_in_columnar_formats(self):
+        job = Job.objects.create(user=self.user, kind='transaction_stats', status='succeeded', result={'dates': []})
+        url = f'/api/jobs/{job.pk}/result/'
+        response = self.client.get(url, HTTP_ACCEPT='application/x-msgpack')
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+        self.assertEqual(self.client.get(url, {'format': 'columnar'}).status_code, 200)
+
+
+@override_settings(PASSWORD_HASHING_WORKERS=1, PASSWORD_HASHING_QUEUE_SIZE=1, PASSWORD_HASHING_TIMEOUT=5)
+class PasswordHashingTests(TestCase):
+    def setUp(self):
+        # Every test gets its own executor sized by the settings above
+        patcher = mock.patch.multiple(hashing, _executor=None, _slots=None)
+        patcher.start()
+        self.addCleanup(patcher.stop)
+        self.release = threading.Event()
+        self.threads = []
+        self.addCleanup(self.finish_occupied)
+
+    def finish_occupied(self):
+        self.release.set()
+        for thread in self.threads:
+            thread.join()
+
+    def occupy(self, calls):
+        """Start `calls` (1 = the worker, 2 = worker and queue) hashing calls that block until self.release is set"""
+        started = threading.Semaphore(0)
+
+        def blocked():
+            started.release()
+            self.release.wait(5)
+
+        def call():
+            try:
+                hashing.run_hashing(blocked)
+            except hashing.HashingUnavailable:
+                pass
+
+        self.threads = [threading.Thread(target=call) for _ in range(calls)]
+        for thread in self.threads:
+            thread.start()
+        started.acquire(timeout=5)  # the first call is running
+        while calls > 1 and hashing._slots.acquire(blocking=False):
+            hashing._slots.release()  # the queued call has not taken its slot yet
+            time.sleep(0.001)
+
+    def test_requests_beyond_workers_and_queue_get_503(self):
+        self.occupy(2)
+        response = APIClient().post(
+            reverse('register'), {'username': 'late', 'email': 'late@example.com', 'password': 'password'}
+        )
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    def test_admin_login_gets_503_instead_of_500(self):
+        User.objects.create_superuser('admin', 'admin@example.com', 'password')
+        self.occupy(2)
+        response = self.client.post('/admin/login/', {'username': 'admin', 'password': 'password'})
+        self.assertEqual(response.status_code, 503)
+        self.assertEqual(response['Retry-After'], '1')
+
+    @override_settings(PASSWORD_HASHING_TIMEOUT=0.05)
+    def test_timed_out_queued_call_releases_its_slot(self):
+        self.occupy(1)
+        with self.assertRaises(hashing.HashingUnavailable):
+            hashing.run_hashing(make_password, 'queued')
+        # The running call still holds one slot; the queued one was dropped
+        self.assertTrue(hashing._slots.acquire(blocking=False))
+        hashing._slots.release()
+
+    @override_settings(PASSWORD_HASHERS=[
+        'django.contrib.auth.hashers.PBKDF2PasswordHasher', 'django.contrib.auth.hashers.MD5PasswordHasher',
+    ])
+    def test_rehash_on_login_follows_the_setting(self):
+        for rehash, prefix in ((False, 'md5$'), (True, 'pbkdf2_sha256$')):
+            with self.subTest(rehash=rehash), override_settings(PASSWORD_REHASH_ON_LOGIN=rehash):
+                User.objects.filter(username='legacy').delete()
+                User.objects.create(username='legacy', password=make_password('password', hasher='md5'))
+                self.assertIsNotNone(authenticate(username='legacy', password='password'))
+                self.assertTrue(User.objects.get(username='legacy').password.startswith(prefix))
+
+    def test_register_reports_username_before_email(self):
+        User.objects.create_user('alice', 'alice@example.com', 'password')
+        User.objects.create_user('bob', 'bob@example.com', 'password')
+        client = APIClient()
+
+        response = client.post(reverse('register'), {'username': 'bob', 'email': 'alice@example.com', 'password': 'x'})
+        self.assertEqual(response.data, {'error': 'Username already exists'})
+
+        response = client.post(reverse('register'), {'username': 'carol', 'email': 'bob@example.com', 'password': 'x'})
+        self.assertEqual(response.data, {'error': 'Email already exists'})
+
+
+class ColumnarStatsTests(TestCase):
+    url = '/api/transactions/stats/'
+
+    def setUp(self):
+        cache.clear()
+        self.user = User.objects.create_user('charter', 'charter@example.com', 'password')
+        self.client = APIClient()
+        self.client.force_authenticate(self.user)
+        salary = Category.objects.create(user=self.user, name='Salary', type='income')
+        food = Category.objects.create(user=self.user, name='Food', type='expense')
+        for category, amount, day in (
+            (salary, '1000.10', 2), (food, '0.29', 2), (food, '12.34', 2), (food, '19.99', 4),
+        ):
+            Transaction.objects.create(
+                user=self.user, category=category, amount=Decimal(amount), date=date(2024, 1, day)
+            )
+
+    def test_format_negotiation(self):
+        expected = {
+            'unit': 'cents', 'days': ['2024-01-02', '2024-01-04'], 'income': [100010, 0], 'expenses': [1263, 1999],
+        }
+        response = self.client.get(self.url, {'format': 'columnar'})
+        self.assertEqual(response['Content-Type'], 'application/vnd.budget.columnar+json')
+        self.assertEqual(json.loads(response.content), expected)
+
+        response = self.client.get(self.url, HTTP_ACCEPT='application/vnd.budget.columnar+json')
+        self.assertEqual(json.loads(response.content), expected)
+
+        for params, headers in (({'format': 'msgpack'}, {}), ({}, {'HTTP_ACCEPT': 'application/x-msgpack'})):
+            response = self.client.get(self.url, params, **headers)
+            self.assertEqual(response['Content-Type'], 'application/x-msgpack')
+            self.assertEqual(msgpack.unpackb(response.content), expected)
+
+    def test_zero_fill(self):
+        response = self.client.get(self.url, {'format': 'columnar', 'fill': 'true'})
+        self.assertEqual(response.data['days'], ['2024-01-02', '2024-01-03', '2024-01-04'])
+        self.assertEqual(response.data['expenses'], [1263, 0, 1999])
+
+        response = self.client.get(
+            self.url, {'format': 'columnar', 'fill': 'true', 'start': '2024-01-01', 'end': '2024-01-05'}
+        )
+        self.assertEqual(len(response.data['days']), 5)
+        self.assertEqual(response.data['income'], [0, 100010, 0, 0, 0])
+
+    def test_fill_span_is_capped(self):
+        params = {'format': 'columnar', 'fill': 'true', 'start': '2000-01-01', 'end': '2020-01-01'}
+        self.assertEqual(self.client.get(self.url, params).status_code, 400)
+        # Also refused when the client asks for it to be queued
+        self.assertEqual(self.client.get(self.url, dict(params, **{'async': 'true'})).status_code, 400)
+        self.assertFalse(Job.objects.exists())
+
+    def test_default_json_is_unchanged(self):
+        response = self.client.get(self.url, {'fill': 'true'})
+        self.assertEqual(response['Content-Type'], 'application/json')
+        self.assertEqual(json.loads(response.content), [
+            {'day': '2024-01-02', 'total_income': 1000.1, 'total_expenses': 12.63},
+            {'day': '2024-01-04', 'total_income': None, 'total_expenses': 19.99},
+        ])
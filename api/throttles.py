@@ -0,0 +1,139 @@
+import math
+import time
+
+from rest_framework.throttling import SimpleRateThrottle
+
+from .params import parse_period
+
+
+# Date spans without a start or end are charged as if they covered this many days
+UNBOUNDED_SPAN_DAYS = 3650
+
+
+def date_span_cost(start, end, days_per_token=30, base_cost=1):
+    """
+    Cost of a request over the date range [start, end] (ISO strings, either may be missing).
+    Unparseable dates are priced as an unbounded range.
+    """
+    try:
+        start_date, end_date = parse_period({'start': start, 'end': end})
+    except ValueError:
+        start_date = end_date = None
+
+    if start_date and end_date:
+        span = max((end_date - start_date).days, 0)
+    else:
+        span = UNBOUNDED_SPAN_DAYS
+    return base_cost + span // days_per_token
+
+
+class CostBasedThrottle(SimpleRateThrottle):
+    """
+    Per-user token bucket where each request is charged a cost instead of a flat 1.
+
+    The rate (e.g. '600/min') is the bucket capacity and refill speed. Views set
+    `throttle_cost` or implement `get_throttle_cost(request)` to price their actions.
+    A request needs min(cost, capacity) tokens to start but is charged its full cost,
+    so requests larger than the bucket leave it in debt instead of being capped.
+
+    Buckets live in the default cache and are updated under a short `cache.add` lock so
+    parallel requests from one client cannot all spend the same tokens. They are only
+    shared across worker processes when that cache is (Redis in production); with the
+    local-memory cache each process keeps its own buckets.
+    After a rejection, this process remembers the bucket level and rejects requests that
+    still could not afford their own cost without touching the cache.
+    """
+    scope = 'cost'
+    timer = time.time
+
+    # {cache_key: (tokens, timestamp)} as last seen by a rejection in this process
+    _local_buckets = {}
+    max_local_entries = 10000
+
+    lock_timeout = 1
+    lock_attempts = 100
+    lock_retry_delay = 0.001
+
+    def get_cache_key(self, request, view):
+        if request.user and request.user.is_authenticated:
+            ident = request.user.pk
+        else:
+            ident = self.get_ident(request)
+        return self.cache_format % {'scope': self.scope, 'ident': ident}
+
+    def get_cost(self, request, view):
+        if hasattr(view, 'get_throttle_cost'):
+            return view.get_throttle_cost(request)
+        return getattr(view, 'throttle_cost', 1)
+
+    def allow_request(self, request, view):
+        if self.rate is None:
+            return True
+
+        self.key = self.get_cache_key(request, view)
+        if self.key is None:
+            return True
+
+        self.now = self.timer()
+        self.wait_seconds = 0
+        self.capacity = self.num_requests
+        self.refill_rate = self.capacity / self.duration
+        cost = self.get_cost(request, view)
+        required = min(cost, self.capacity)
+
+        # Fast path: the shared bucket can only hold fewer tokens than this process last saw
+        snapshot = self._local_buckets.get(self.key)
+        if snapshot is not None:
+            tokens = self._refill(*snapshot)
+            if tokens < required:
+                return self._reject(tokens, required, remember=False)
+            # Threads of one worker share the dict, so another may have already removed it
+            self._local_buckets.pop(self.key, None)
+
+        lock_key = f'{self.key}:lock'
+        if not self._acquire(lock_key):
+            # Another request from this client is holding the bucket for too long
+            self.wait_seconds = self.lock_timeout
+            return False
+        try:
+            tokens = self._refill(*self.cache.get(self.key, (self.capacity, self.now)))
+            if tokens < required:
+                return self._reject(tokens, required)
+
+            remaining = tokens - cost
+            # Keep the bucket until it would have refilled to capacity anyway
+            timeout = math.ceil((self.capacity - remaining) / self.refill_rate) + 1
+            self.cache.set(self.key, (remaining, self.now), timeout)
+            return True
+        finally:
+            self.cache.delete(lock_key)
+
+    def _refill(self, tokens, updated_at):
+        return min(self.capacity, tokens + (self.now - updated_at) * self.refill_rate)
+
+    def _acquire(self, lock_key):
+        for _ in range(self.lock_attempts):
+            if self.cache.add(lock_key, 1, self.lock_timeout):
+                return True
+            time.sleep(self.lock_retry_delay)
+        return False
+
+    def _reject(self, tokens, required, remember=True):
+        self.wait_seconds = (required - tokens) / self.refill_rate
+        if remember:
+            if len(self._local_buckets) >= self.max_local_entries:
+                self._prune_local()
+            self._local_buckets[self.key] = (tokens, self.now)
+        return False
+
+    def _prune_local(self):
+        # Entries older than a full refill period no longer reject anything
+        expired = [
+            key for key, (tokens, updated_at) in list(self._local_buckets.items())
+            if self.now - updated_at >= self.duration
+        ]
+        for key in expired:
+            self._local_buckets.pop(key, None)
+
+    def wait(self):
+        return self.wait_seconds
@@ -1,14 +1,18 @@
 from django.urls import path, include
 from rest_framework.routers import DefaultRouter
-from .views import CategoryViewSet, TransactionViewSet, BudgetViewSet, SummaryViewSet, register_user
+from .views import CategoryViewSet, TransactionViewSet, BudgetViewSet, SummaryViewSet, AnalyticsViewSet, BalanceHistoryViewSet, JobViewSet, register_user, hashing_metrics_view
 
 router = DefaultRouter()
 router.register(r'categories', CategoryViewSet)
 router.register(r'transactions', TransactionViewSet)
 router.register(r'budgets', BudgetViewSet)
+router.register(r'jobs', JobViewSet)
 
 urlpatterns = [
     path('', include(router.urls)),
     path('summary/', SummaryViewSet.as_view({'get': 'list'}), name='summary-list'),
+    path('analytics/', AnalyticsViewSet.as_view({'get': 'list'}), name='analytics-list'),
+    path('balance/history/', BalanceHistoryViewSet.as_view({'get': 'list'}), name='balance-history'),
     path('register/', register_user, name='register'),
+    path('metrics/hashing/', hashing_metrics_view, name='hashing-metrics'),
 ]
@@ -1,17 +1,49 @@
-from rest_framework import viewsets, status
+from rest_framework import viewsets, status, mixins
 from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.response import Response
-from rest_framework.permissions import IsAuthenticated, AllowAny
+from rest_framework.permissions import IsAuthenticated, AllowAny, IsAdminUser
 from django.contrib.auth.models import User
-from django.db.models import Sum, Q
+from django.urls import reverse
+from django.db.models import Q, Case, When
 from django.db.models.functions import TruncMonth, TruncDay
 from django.utils import timezone
-from datetime import datetime, date
-from decimal import Decimal
+from datetime import datetime, date, timedelta
 
-from .models import Category, Transaction, Budget
-from .serializers import CategorySerializer, TransactionSerializer, BudgetSerializer, SummarySerializer
+from .models import Category, Transaction, Budget, Job
+from .serializers import CategorySerializer, TransactionSerializer, BudgetSerializer, JobSerializer
 from .filters import TransactionFilter
+from .params import check_fill_span, parse_flag, parse_period, parse_year_month
+from .renderers import COLUMNAR_FORMATS, columnar_renderer_classes
+from .throttles import date_span_cost
+from .hashing import HashingUnavailable, hash_password, hashing_metrics
+from .analytics import spending_analytics
+from .reports import columnar_daily_stats, daily_stats, monthly_summary
+from .deletion import schedule_category_deletion
+from .balance import INTERVALS, balance_history
+from .jobs import PUBLIC_JOB_KINDS, estimate_job_cost, should_run_async, submit_job
+
+
+def job_location(request, job):
+    # Not DRF's reverse: it would carry ?format=columnar/msgpack over to the job URL, which has no such format
+    return request.build_absolute_uri(reverse('job-detail', args=[job.pk]))
+
+
+class AsyncJobMixin:
+    """
+    Lets heavy actions hand their work to the background job queue: when the estimated
+    cost is above JOB_ASYNC_COST_THRESHOLD (or ?async=true), a Job is queued and 202 returned.
+    """
+    
+    def submit_if_heavy(self, request, kind, params):
+        estimated_cost = estimate_job_cost(kind, params)
+        if not should_run_async(request, estimated_cost):
+            return None
+        job = submit_job(request.user, kind, params, estimated_cost=estimated_cost)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': job_location(request, job)}
+        )
 
 
 class CategoryViewSet(viewsets.ModelViewSet):
@@ -20,10 +52,19 @@ class CategoryViewSet(viewsets.ModelViewSet):
     queryset = Category.objects.none()  # Will be overridden in get_queryset
     
     def get_queryset(self):
-        return Category.objects.filter(user=self.request.user)
+        return Category.objects.filter(user=self.request.user, pending_delete=False)
+    
+    def destroy(self, request, *args, **kwargs):
+        # Hide the category now; its transactions are removed in chunks by the job worker
+        job = schedule_category_deletion(self.get_object(), request.user)
+        return Response(
+            JobSerializer(job).data,
+            status=status.HTTP_202_ACCEPTED,
+            headers={'Location': job_location(request, job)}
+        )
 
 
-class TransactionViewSet(viewsets.ModelViewSet):
+class TransactionViewSet(AsyncJobMixin, viewsets.ModelViewSet):
     serializer_class = TransactionSerializer
     permission_classes = [IsAuthenticated]
     filterset_class = TransactionFilter
@@ -32,7 +73,9 @@ class TransactionViewSet(viewsets.ModelViewSet):
     queryset = Transaction.objects.none()  # Will be overridden in get_queryset
     
     def get_queryset(self):
-        queryset = Transaction.objects.filter(user=self.request.user).select_related('category')
+        queryset = Transaction.objects.filter(
+            user=self.request.user, category__pending_delete=False
+        ).select_related('category')
         # Apply filters
         filterset = self.filterset_class(self.request.GET, queryset=queryset, user=self.request.user)
         return filterset.qs
@@ -40,28 +83,49 @@ class TransactionViewSet(viewsets.ModelViewSet):
     def perform_create(self, serializer):
         serializer.save(user=self.request.user)
     
-    @action(detail=False, methods=['get'])
+    def get_throttle_cost(self, request):
+        # Stats cost grows with the requested date range
+        if self.action == 'stats':
+            return date_span_cost(request.query_params.get('start'), request.query_params.get('end'))
+        return 1
+    
+    @action(detail=False, methods=['get'], renderer_classes=columnar_renderer_classes())
     def stats(self, request):
         """Get transaction statistics for charts"""
-        start = request.query_params.get('start')
-        end = request.query_params.get('end')
+        try:
+            start, end = parse_period(request.query_params)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid start or end date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        queryset = Transaction.objects.filter(user=request.user)
+        # Compact columnar format (?format=columnar / msgpack, or via Accept header)
+        columnar = request.accepted_renderer.format in COLUMNAR_FORMATS
+        fill = parse_flag(request.query_params.get('fill', ''))
+        if columnar and fill:
+            try:
+                check_fill_span(start, end)
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        if start:
-            queryset = queryset.filter(date__gte=start)
-        if end:
-            queryset = queryset.filter(date__lte=end)
+        job_response = self.submit_if_heavy(request, 'transaction_stats', {
+            'start': start and start.isoformat(),
+            'end': end and end.isoformat(),
+            'columnar': columnar,
+            'fill': fill,
+        })
+        if job_response is not None:
+            return job_response
         
-        # Group by day for time series
-        daily_stats = queryset.extra(
-            select={'day': 'date'}
-        ).values('day').annotate(
-            total_income=Sum('amount', filter=Q(category__type='income')),
-            total_expenses=Sum('amount', filter=Q(category__type='expense'))
-        ).order_by('day')
+        if columnar:
+            try:
+                return Response(columnar_daily_stats(request.user, start, end, fill=fill))
+            except ValueError as e:
+                return Response({'error': str(e)}, status=status.HTTP_400_BAD_REQUEST)
         
-        return Response(daily_stats)
+        # Group by day for time series
+        return Response(daily_stats(request.user, start, end))
 
 
 class BudgetViewSet(viewsets.ModelViewSet):
@@ -85,72 +149,115 @@ class BudgetViewSet(viewsets.ModelViewSet):
         serializer.save(user=self.request.user)
 
 
-class SummaryViewSet(viewsets.ViewSet):
+class SummaryViewSet(AsyncJobMixin, viewsets.ViewSet):
     permission_classes = [IsAuthenticated]
+    throttle_cost = 5
     queryset = Transaction.objects.none()  # Required for router
     
     def list(self, request):
         """Get summary data for dashboard"""
-        year = request.query_params.get('year', timezone.now().year)
-        month = request.query_params.get('month', timezone.now().month)
-        
         try:
-            year = int(year)
-            month = int(month)
-        except (ValueError, TypeError):
+            year, month = parse_year_month(
+                request.query_params, default_year=timezone.now().year, default_month=timezone.now().month
+            )
+        except ValueError:
             return Response(
                 {'error': 'Invalid year or month'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Get transactions for the specified month
-        transactions = Transaction.objects.filter(
-            user=request.user,
-            date__year=year,
-            date__month=month
-        ).select_related('category')
+        job_response = self.submit_if_heavy(request, 'summary', {'year': year, 'month': month})
+        if job_response is not None:
+            return job_response
         
-        # Calculate totals
-        total_income = transactions.filter(category__type='income').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        return Response(monthly_summary(request.user, year, month))
+
+
+class AnalyticsViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    queryset = Transaction.objects.none()  # Required for router
+    
+    def get_throttle_cost(self, request):
+        return date_span_cost(request.query_params.get('start'), request.query_params.get('end'))
+    
+    def list(self, request):
+        """Get per-category spending statistics (percentiles, weekday/month patterns, outliers)"""
+        try:
+            start, end = parse_period(request.query_params)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid start or end date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        total_expenses = transactions.filter(category__type='expense').aggregate(
-            total=Sum('amount')
-        )['total'] or Decimal('0.00')
+        return Response(spending_analytics(request.user, start, end))
+
+
+class BalanceHistoryViewSet(viewsets.ViewSet):
+    permission_classes = [IsAuthenticated]
+    queryset = Transaction.objects.none()  # Required for router
+    
+    def list(self, request):
+        """Get the running balance at the end of each day or month with activity"""
+        try:
+            start, end = parse_period(request.query_params)
+        except ValueError:
+            return Response(
+                {'error': 'Invalid start or end date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        balance = total_income - total_expenses
+        interval = request.query_params.get('interval', 'day')
+        if interval not in INTERVALS:
+            return Response(
+                {'error': f"Interval must be one of: {', '.join(INTERVALS)}"},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Get breakdown by category
-        by_category = []
-        for transaction in transactions:
-            category_data = {
-                'category': transaction.category.name,
-                'type': transaction.category.type,
-                'amount': str(transaction.amount)
-            }
-            by_category.append(category_data)
+        end = end or timezone.now().date()
+        start = start or end - timedelta(days=365)
+        if start > end:
+            return Response(
+                {'error': 'Start date must not be after end date'},
+                status=status.HTTP_400_BAD_REQUEST
+            )
         
-        # Get monthly budget
-        try:
-            budget = Budget.objects.get(user=request.user, year=year, month=month)
-            monthly_budget = budget.amount
-            budget_variance = monthly_budget - total_expenses
-        except Budget.DoesNotExist:
-            monthly_budget = None
-            budget_variance = None
-        
-        summary_data = {
-            'total_income': str(total_income),
-            'total_expenses': str(total_expenses),
-            'balance': str(balance),
-            'by_category': by_category,
-            'monthly_budget': str(monthly_budget) if monthly_budget else None,
-            'budget_variance': str(budget_variance) if budget_variance is not None else None,
-        }
-        
-        serializer = SummarySerializer(summary_data)
-        return Response(serializer.data)
+        return Response(balance_history(request.user, start, end, interval))
+
+
+class JobViewSet(mixins.CreateModelMixin, viewsets.ReadOnlyModelViewSet):
+    serializer_class = JobSerializer
+    permission_classes = [IsAuthenticated]
+    queryset = Job.objects.none()  # Will be overridden in get_queryset
+    
+    def get_queryset(self):
+        return Job.objects.filter(user=self.request.user)
+    
+    def get_throttle_cost(self, request):
+        # Queued work is charged up front, the same as running it inline.
+        # Throttling runs before validation, so malformed bodies just get the base cost.
+        data = request.data if isinstance(request.data, dict) else {}
+        kind = data.get('kind')
+        params = data.get('params') or {}
+        if self.action == 'create' and isinstance(kind, str) and kind in PUBLIC_JOB_KINDS \
+                and isinstance(params, dict):
+            return estimate_job_cost(kind, params)
+        return 1
+    
+    def perform_create(self, serializer):
+        kind = serializer.validated_data['kind']
+        params = serializer.validated_data.get('params', {})
+        serializer.save(user=self.request.user, estimated_cost=estimate_job_cost(kind, params))
+    
+    @action(detail=True, methods=['get'], renderer_classes=columnar_renderer_classes())
+    def result(self, request, pk=None):
+        """Get the result of a finished job, in the same formats as the endpoint that queued it"""
+        job = self.get_object()
+        if job.status == 'succeeded':
+            return Response(job.result)
+        if job.status == 'failed':
+            return Response({'error': job.error}, status=status.HTTP_500_INTERNAL_SERVER_ERROR)
+        return Response(JobSerializer(job).data, status=status.HTTP_202_ACCEPTED)
 
 
 @api_view(['POST'])
@@ -173,27 +280,34 @@ def register_user(request):
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Check if user already exists
-        if User.objects.filter(username=username).exists():
+        # Check username and email uniqueness in one query (a username match sorts first)
+        existing = User.objects.filter(
+            Q(username=username) | Q(email=email)
+        ).order_by(
+            Case(When(username=username, then=0), default=1)
+        ).values_list('username', flat=True).first()
+        
+        if existing == username:
             return Response(
                 {'error': 'Username already exists'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        if User.objects.filter(email=email).exists():
+        if existing is not None:
             return Response(
                 {'error': 'Email already exists'}, 
                 status=status.HTTP_400_BAD_REQUEST
             )
         
-        # Create user
-        user = User.objects.create_user(
-            username=username,
-            email=email,
-            password=password,
+        # Create user, hashing the password on the bounded hashing executor
+        user = User(
+            username=User.normalize_username(username),
+            email=User.objects.normalize_email(email),
             first_name=first_name,
-            last_name=last_name
+            last_name=last_name,
+            password=hash_password(password),
         )
+        user.save()
         
         return Response(
             {
@@ -209,8 +323,19 @@ def register_user(request):
             status=status.HTTP_201_CREATED
         )
         
+    except HashingUnavailable:
+        raise
     except Exception as e:
         return Response(
             {'error': str(e)}, 
             status=status.HTTP_500_INTERNAL_SERVER_ERROR
         )
+
+
+@api_view(['GET'])
+@permission_classes([IsAdminUser])
+def hashing_metrics_view(request):
+    """
+    Password hashing executor metrics (per-hash CPU time, rejections)
+    """
+    return Response(hashing_metrics())
@@ -45,6 +45,7 @@ MIDDLEWARE = [
     'django.contrib.auth.middleware.AuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
+    'api.middleware.HashingUnavailableMiddleware',
 ]
 
 ROOT_URLCONF = 'budget_tracker.urls'
@@ -91,6 +92,18 @@ AUTH_PASSWORD_VALIDATORS = [
     },
 ]
 
+AUTHENTICATION_BACKENDS = [
+    'api.backends.OffloadedModelBackend',
+]
+
+# Password hashing runs on a bounded per-process executor; requests beyond workers + queue get a 503.
+# This only limits anything with threaded gunicorn workers (see gunicorn.conf.py), so keep
+# workers + queue below GUNICORN_THREADS.
+PASSWORD_HASHING_WORKERS = config('PASSWORD_HASHING_WORKERS', default=2, cast=int)
+PASSWORD_HASHING_QUEUE_SIZE = config('PASSWORD_HASHING_QUEUE_SIZE', default=4, cast=int)
+PASSWORD_HASHING_TIMEOUT = config('PASSWORD_HASHING_TIMEOUT', default=10, cast=float)
+PASSWORD_REHASH_ON_LOGIN = config('PASSWORD_REHASH_ON_LOGIN', default=True, cast=bool)
+
 # Internationalization
 LANGUAGE_CODE = 'en-us'
 TIME_ZONE = 'UTC'
@@ -119,8 +132,26 @@ REST_FRAMEWORK = {
         'rest_framework.filters.SearchFilter',
         'rest_framework.filters.OrderingFilter',
     ],
+    'DEFAULT_THROTTLE_CLASSES': [
+        'api.throttles.CostBasedThrottle',
+    ],
+    'DEFAULT_THROTTLE_RATES': {
+        'cost': config('THROTTLE_COST_RATE', default='600/min'),
+    },
 }
 
+# Requests whose estimated cost (see api.throttles) reaches this are queued as background jobs.
+# The default keeps unbounded stats ranges (cost 122) inline for existing clients.
+JOB_ASYNC_COST_THRESHOLD = config('JOB_ASYNC_COST_THRESHOLD', default=150, cast=int)
+# At or above this cost work is always queued, even with ?async=false
+JOB_INLINE_COST_LIMIT = config('JOB_INLINE_COST_LIMIT', default=600, cast=int)
+# Running jobs without a worker heartbeat for this many seconds are requeued, up to JOB_MAX_ATTEMPTS times
+JOB_STALE_AFTER = config('JOB_STALE_AFTER', default=300, cast=int)
+JOB_MAX_ATTEMPTS = config('JOB_MAX_ATTEMPTS', default=3, cast=int)
+
+# Rows removed per batch (and per transaction) by background category/user deletion
+DELETION_CHUNK_SIZE = config('DELETION_CHUNK_SIZE', default=1000, cast=int)
+
 # JWT Settings
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(minutes=60),
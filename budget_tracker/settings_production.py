@@ -3,6 +3,7 @@ Production settings for budget_tracker project.
 """
 
 import os
+import warnings
 import dj_database_url
 from .settings import *
 
@@ -18,6 +19,22 @@ DATABASES = {
     )
 }
 
+# Cache (shared throttle buckets across workers)
+if os.getenv('REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.redis.RedisCache',
+            'LOCATION': os.getenv('REDIS_URL'),
+        }
+    }
+else:
+    # LocMem is per process: every gunicorn worker gets its own throttle buckets and locks
+    warnings.warn(
+        'REDIS_URL is not set; throttle buckets fall back to the per-process local-memory cache, '
+        'so each client gets WEB_CONCURRENCY times the configured THROTTLE_COST_RATE',
+        RuntimeWarning,
+    )
+
 # Static files (CSS, JavaScript, Images)
 STATIC_URL = '/static/'
 STATIC_ROOT = os.path.join(BASE_DIR, 'staticfiles')
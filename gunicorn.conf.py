@@ -0,0 +1,12 @@
+"""
+Gunicorn configuration, loaded automatically from the project root by every start command.
+"""
+from decouple import config as env
+
+# Threaded workers let several requests per process reach the password hashing executor
+# (api/hashing.py). It runs at most PASSWORD_HASHING_WORKERS hashes per process, queues
+# PASSWORD_HASHING_QUEUE_SIZE more and answers 503 beyond that, while the remaining
+# threads keep serving other requests. Keep workers + queue below `threads`.
+worker_class = 'gthread'
+workers = env('WEB_CONCURRENCY', default=2, cast=int)
+threads = env('GUNICORN_THREADS', default=8, cast=int)